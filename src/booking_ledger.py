@@ -0,0 +1,246 @@
+import datetime
+import fcntl
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+from constant import LEDGER_LEASE_SECONDS
+
+CONFIRMED = "confirmed"
+IN_FLIGHT = "in_flight"
+
+
+class BookingLedger:
+    """
+    A class that keeps track of secured and in-flight bookings on disk.
+
+    Entries are keyed by account, facility, activity, date and time, so
+    reruns of the application skip slots which are already reserved.
+
+    Attributes:
+    - json_file_path (str): Path to the JSON file of the ledger.
+    - account (str): The account the bookings are made for.
+    - entries (dict): Ledger entries keyed by booking key.
+    - lock (threading.Lock): Lock held while the ledger is updated.
+
+    Methods:
+    - __init__(json_file_path: str, account: str):
+        Initialize the BookingLedger class.
+    - filter_slots(available_slots) -> Dict[str, Dict[str, Any]]:
+        Remove slots which are already reserved or being reserved.
+    - acquire(rec_name, rec_details, rec_slot) -> bool:
+        Take a lease on the slot before reserving it.
+    - confirm(rec_name, rec_details, rec_slot):
+        Record the slot as reserved.
+    - release(rec_name, rec_details, rec_slot):
+        Drop the lease on the slot after a failed reservation.
+    """
+
+    def __init__(self, json_file_path: str, account: str) -> None:
+        """
+        Initialize the BookingLedger class.
+
+        Args:
+            json_file_path (str): Path to the JSON file of the ledger.
+            account (str): The account the bookings are made for.
+        """
+        self.json_file_path: str = json_file_path
+        self.account: str = account
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+        self.lock: threading.Lock = threading.Lock()
+
+    def filter_slots(
+        self, available_slots: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Remove slots which are already reserved or being reserved.
+
+        Args:
+            available_slots (dict): Slots grouped by facility (SlotFinder).
+
+        Returns:
+            dict: Slots which still have to be reserved, grouped by facility.
+        """
+        remaining_slots: Dict[str, Dict[str, Any]] = {}
+        for rec_name, rec_details in available_slots.items():
+            slots = []
+            for rec_slot in rec_details["slots"]:
+                entry = self._active_entry(
+                    self._key(rec_name, rec_details, rec_slot)
+                )
+                if entry is None:
+                    slots.append(rec_slot)
+                    continue
+
+                logging.info(
+                    '✅ Skipping slot in %s at %s, already %s',
+                    rec_name, rec_slot["starting_time"],
+                    entry["status"].replace("_", "-")
+                )
+
+            if slots:
+                remaining_slots[rec_name] = {**rec_details, "slots": slots}
+
+        return remaining_slots
+
+    def acquire(self, rec_name: str, rec_details: dict,
+                rec_slot: dict) -> bool:
+        """
+        Take a lease on the slot before reserving it.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+            rec_details (dict): Details of the recreation facility.
+            rec_slot (dict): Details of the slot to be reserved.
+
+        Returns:
+            bool: False if the slot is reserved or leased by another run.
+        """
+        with self._locked():
+            self.entries = self._load()
+            key = self._key(rec_name, rec_details, rec_slot)
+            if self._active_entry(key) is not None:
+                return False
+
+            self.entries[key] = {
+                "status": IN_FLIGHT,
+                "date": rec_slot["date"],
+                "expires": time.time() + LEDGER_LEASE_SECONDS
+            }
+            self._save()
+            return True
+
+    def confirm(self, rec_name: str, rec_details: dict,
+                rec_slot: dict) -> None:
+        """
+        Record the slot as reserved.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+            rec_details (dict): Details of the recreation facility.
+            rec_slot (dict): Details of the reserved slot.
+        """
+        with self._locked():
+            self.entries = self._load()
+            self.entries[self._key(rec_name, rec_details, rec_slot)] = {
+                "status": CONFIRMED,
+                "date": rec_slot["date"]
+            }
+            self._save()
+
+    def release(self, rec_name: str, rec_details: dict,
+                rec_slot: dict) -> None:
+        """
+        Drop the lease on the slot after a failed reservation.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+            rec_details (dict): Details of the recreation facility.
+            rec_slot (dict): Details of the slot.
+        """
+        with self._locked():
+            self.entries = self._load()
+            key = self._key(rec_name, rec_details, rec_slot)
+            if self.entries.get(key, {}).get("status") == IN_FLIGHT:
+                del self.entries[key]
+                self._save()
+
+    def _key(self, rec_name: str, rec_details: dict, rec_slot: dict) -> str:
+        """
+        Build the ledger key of the slot.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+            rec_details (dict): Details of the recreation facility.
+            rec_slot (dict): Details of the slot.
+
+        Returns:
+            str: Key built from account, facility, activity, date and time.
+        """
+        return "|".join((
+            self.account,
+            rec_name,
+            rec_details["activity_button"],
+            rec_slot["date"],
+            rec_slot["starting_time"]
+        ))
+
+    def _active_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the entry if it is confirmed or has an unexpired lease.
+
+        Args:
+            key (str): Ledger key of the slot.
+
+        Returns:
+            dict: The ledger entry, or None if the slot is free to reserve.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry["status"] == IN_FLIGHT and entry["expires"] < time.time():
+            return None
+        return entry
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """
+        Hold the ledger exclusively, against other threads and other runs.
+
+        Other runs are locked out with flock on a lock file next to the
+        ledger, so the lock works for runs on the same machine.
+        """
+        with self.lock:
+            with open(self.json_file_path + ".lock", "a",
+                      encoding="utf-8") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Load the ledger from disk, dropping entries for past dates.
+
+        A ledger which can't be decoded is moved aside and the application
+        stops, so confirmed bookings are never overwritten with an empty
+        ledger.
+
+        Returns:
+            dict: Ledger entries keyed by booking key.
+        """
+        try:
+            with open(self.json_file_path, encoding="utf-8") as file:
+                entries: Dict[str, Dict[str, Any]] = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError as err:
+            corrupt_path: str = (
+                f'{self.json_file_path}.corrupt-{int(time.time())}'
+            )
+            os.replace(self.json_file_path, corrupt_path)
+            logging.error(
+                '❌ Error decoding ledger JSON: %s, moved it to %s',
+                err, corrupt_path
+            )
+            sys.exit(1)
+
+        today: str = datetime.date.today().isoformat()
+        return {
+            key: entry for key, entry in entries.items()
+            if entry.get("date", "") >= today
+        }
+
+    def _save(self) -> None:
+        """
+        Write the ledger to disk atomically.
+        """
+        tmp_path: str = self.json_file_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.json_file_path)
@@ -0,0 +1,330 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+from constant import CHROME_HEADLESS, TAB_POOL_SIZE, TAB_MEMORY_BUDGET_MB
+
+
+@contextmanager
+def open_browser() -> Iterator[webdriver.Chrome]:
+    """
+    Start Chrome and stop it once the block is finished.
+
+    Yields:
+        webdriver.Chrome: The Chrome webdriver instance.
+    """
+    chrome_options: Options = Options()
+    if CHROME_HEADLESS:
+        chrome_options.add_argument("--headless")
+    service: Service = Service(ChromeDriverManager().install())
+    service.start()
+
+    try:
+        with webdriver.Chrome(
+            service=service,
+            options=chrome_options
+        ) as driver:
+            yield driver
+    finally:
+        service.stop()
+
+
+def process_tree_memory_mb(pid: int) -> float:
+    """
+    Sum the resident memory of the process and all its descendants.
+
+    Only works where /proc is available (Linux), returns 0 elsewhere.
+
+    Args:
+        pid (int): ID of the root process (chromedriver).
+
+    Returns:
+        float: Resident memory in MB.
+    """
+    children: Dict[int, List[int]] = {}
+    rss_pages: Dict[int, int] = {}
+    try:
+        proc_ids = [int(name) for name in os.listdir("/proc")
+                    if name.isdigit()]
+    except FileNotFoundError:
+        return 0.0
+
+    for proc_id in proc_ids:
+        try:
+            with open(f"/proc/{proc_id}/stat", encoding="utf-8") as file:
+                parent_id = int(file.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{proc_id}/statm", encoding="utf-8") as file:
+                rss_pages[proc_id] = int(file.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent_id, []).append(proc_id)
+
+    total_pages, stack = 0, [pid]
+    while stack:
+        proc_id = stack.pop()
+        total_pages += rss_pages.get(proc_id, 0)
+        stack.extend(children.get(proc_id, []))
+
+    return total_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+class TabPool:
+    """
+    A class that serves concurrent jobs as tabs inside one Chrome instance.
+
+    Each tab lives in its own browser context, so cookies and sessions of
+    jobs don't mix. Each tab is also driven by its own WebDriver session.
+    The session is attached to the same Chrome through its debugger
+    address, so jobs in different tabs run their commands in parallel.
+    Tabs are recycled between jobs. No new tab is opened while Chrome uses
+    more memory than the budget, and tabs are closed on release until it
+    fits again.
+
+    Attributes:
+    - driver (webdriver.Chrome): The Chrome webdriver instance, used to
+        create and dispose browser contexts.
+    - size (int): The maximum number of tabs.
+    - memory_budget_mb (float): The memory budget of Chrome in MB.
+    - lock (threading.Condition): Lock guarding the tabs and the CDP calls
+        of the driver, also notified when a tab is released.
+    - stats (dict): Job latencies and peak memory usage.
+
+    Methods:
+    - tab():
+        Context manager that lends a tab to a job.
+    - memory_mb() -> float:
+        Return the memory used by Chrome in MB.
+    - report() -> str:
+        Log and return the summary of served jobs.
+    - close():
+        Close all tabs of the pool.
+    """
+
+    def __init__(self, driver: webdriver.Chrome, size: int = TAB_POOL_SIZE,
+                 memory_budget_mb: float = TAB_MEMORY_BUDGET_MB) -> None:
+        """
+        Initialize the TabPool class.
+
+        Args:
+            driver (webdriver.Chrome): The Chrome webdriver instance.
+            size (int): The maximum number of tabs.
+            memory_budget_mb (float): The memory budget of Chrome in MB.
+        """
+        self.driver: webdriver.Chrome = driver
+        self.size: int = size
+        self.memory_budget_mb: float = memory_budget_mb
+        self.lock: threading.Condition = threading.Condition(
+            threading.RLock()
+        )
+        self.stats: Dict[str, Any] = {"latencies": [], "peak_memory_mb": 0.0}
+        self._tabs: List[Dict[str, Any]] = []
+
+    def __enter__(self) -> "TabPool":
+        """
+        Return the pool for use in a with statement.
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Close all tabs of the pool when the with statement is finished.
+        """
+        self.close()
+
+    @contextmanager
+    def tab(self) -> Iterator[webdriver.Remote]:
+        """
+        Context manager that lends a tab to a job.
+
+        Yields:
+            webdriver.Remote: WebDriver session of the tab.
+        """
+        started: float = time.monotonic()
+        tab = self._acquire()
+        try:
+            yield tab["session"]
+        finally:
+            self._release(tab)
+            self.stats["latencies"].append(time.monotonic() - started)
+
+    def memory_mb(self) -> float:
+        """
+        Return the memory used by Chrome in MB.
+
+        Returns:
+            float: Resident memory of chromedriver and Chrome processes.
+        """
+        memory: float = process_tree_memory_mb(
+            self.driver.service.process.pid
+        )
+        self.stats["peak_memory_mb"] = max(
+            self.stats["peak_memory_mb"], memory
+        )
+        return memory
+
+    def report(self) -> str:
+        """
+        Log and return the summary of served jobs.
+
+        Returns:
+            str: Number of jobs, job latencies and peak memory usage.
+        """
+        latencies: List[float] = self.stats["latencies"] or [0.0]
+        summary: str = (
+            f'{len(self.stats["latencies"])} jobs in up to {self.size} tabs, '
+            f'mean latency {sum(latencies) / len(latencies):.1f}s, '
+            f'max latency {max(latencies):.1f}s, '
+            f'peak memory {self.stats["peak_memory_mb"]:.0f} MB '
+            f'(budget {self.memory_budget_mb:.0f} MB)'
+        )
+        logging.info('Tab pool: %s', summary)
+        return summary
+
+    def close(self) -> None:
+        """
+        Close all tabs of the pool.
+        """
+        with self.lock:
+            for tab in self._tabs:
+                self._close_tab(tab)
+            self._tabs.clear()
+
+    def _acquire(self) -> Dict[str, Any]:
+        """
+        Take a free tab, or open a new one if the limits allow it.
+
+        Returns:
+            dict: The session, window handle and browser context of the tab.
+        """
+        with self.lock:
+            while True:
+                for tab in self._tabs:
+                    if not tab["busy"]:
+                        tab["busy"] = True
+                        return tab
+                if not self._tabs or (
+                    len(self._tabs) < self.size and
+                    self.memory_mb() < self.memory_budget_mb
+                ):
+                    # Count the tab right away, it is opened without the lock
+                    tab = {"busy": True}
+                    self._tabs.append(tab)
+                    break
+                self.lock.wait()
+
+        try:
+            self._open_tab(tab)
+        except WebDriverException:
+            self._close_tab(tab)
+            with self.lock:
+                self._tabs.remove(tab)
+                self.lock.notify()
+            raise
+        return tab
+
+    def _release(self, tab: Dict[str, Any]) -> None:
+        """
+        Recycle the tab, or close it if Chrome is over the memory budget.
+
+        A tab which fails to be reset is closed as well.
+
+        Args:
+            tab (dict): The session, window handle and browser context of
+                the tab.
+        """
+        recycled: bool = False
+        try:
+            tab["session"].get("about:blank")
+            with self.lock:
+                if (len(self._tabs) > 1 and
+                        self.memory_mb() > self.memory_budget_mb):
+                    logging.info('Closing tab, memory budget is exceeded')
+                else:
+                    self.driver.execute_cdp_cmd("Storage.clearCookies", {
+                        "browserContextId": tab["context"]
+                    })
+                    recycled = True
+        except WebDriverException as err:
+            logging.error('❌ Failed to reset tab %s: %s', tab["handle"], err)
+        finally:
+            if not recycled:
+                self._close_tab(tab)
+            with self.lock:
+                if recycled:
+                    tab["busy"] = False
+                else:
+                    self._tabs.remove(tab)
+                self.lock.notify()
+
+    def _open_tab(self, tab: Dict[str, Any]) -> None:
+        """
+        Open a tab in a new browser context with its own WebDriver session.
+
+        Args:
+            tab (dict): The tab to fill with session, handle and context.
+        """
+        with self.lock:
+            tab["context"] = self.driver.execute_cdp_cmd(
+                "Target.createBrowserContext", {}
+            )["browserContextId"]
+            target_id: str = self.driver.execute_cdp_cmd(
+                "Target.createTarget", {
+                    "url": "about:blank",
+                    "browserContextId": tab["context"]
+                }
+            )["targetId"]
+
+        options: Options = Options()
+        options.add_experimental_option(
+            "debuggerAddress",
+            self.driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        )
+        tab["session"] = webdriver.Remote(
+            command_executor=self.driver.service.service_url,
+            options=options
+        )
+        # Window handles of chromedriver are built from target IDs
+        tab["handle"] = next((
+            window_handle for window_handle in tab["session"].window_handles
+            if window_handle.endswith(target_id)
+        ), target_id)
+        tab["session"].switch_to.window(tab["handle"])
+
+        logging.info('Opened tab %s, Chrome uses %.0f MB',
+                     tab["handle"], self.memory_mb())
+
+    def _close_tab(self, tab: Dict[str, Any]) -> None:
+        """
+        Close the tab together with its browser context and session.
+
+        The session is attached to Chrome, so quitting it leaves Chrome
+        running. Parts of a tab which failed to open are skipped, and
+        errors are logged, so a broken tab is always cleaned up as far as
+        possible.
+
+        Args:
+            tab (dict): The session, window handle and browser context of
+                the tab.
+        """
+        if "session" in tab:
+            try:
+                tab["session"].quit()
+            except WebDriverException as err:
+                logging.error('❌ Failed to quit tab session: %s', err)
+
+        if "context" in tab:
+            try:
+                with self.lock:
+                    self.driver.execute_cdp_cmd(
+                        "Target.disposeBrowserContext",
+                        {"browserContextId": tab["context"]}
+                    )
+            except WebDriverException as err:
+                logging.error('❌ Failed to dispose tab context: %s', err)
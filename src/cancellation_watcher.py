@@ -0,0 +1,478 @@
+import hashlib
+import heapq
+import logging
+import random
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+import requests
+from slot_reservation import SlotReservation, TIME_SLOT_LABEL_RE
+from constant import (
+    GROUP_SIZE, WATCH_DURATION, WATCH_MIN_INTERVAL, WATCH_MAX_INTERVAL,
+    WATCH_MAX_ATTEMPTS, WATCH_REQUEST_TIMEOUT, TAB_POOL_SIZE
+)
+
+VOLATILE_HTML_RE = re.compile(
+    r'<input[^>]*type="hidden"[^>]*>|<script.*?</script>', re.S | re.I
+)
+
+
+class ReservationPageParser(HTMLParser):
+    """
+    A class that collects links, forms and slot labels of a reservation page.
+
+    Attributes:
+    - links (list): Tuples of link address and link text.
+    - forms (list): Dictionaries with form action and input values.
+    - labels (list): Values of all aria-label attributes.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the ReservationPageParser class.
+        """
+        super().__init__()
+        self.links: List[Tuple[str, str]] = []
+        self.forms: List[Dict[str, Any]] = []
+        self.labels: List[str] = []
+        self._link: Optional[List[str]] = None
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        """
+        Collect the link, form, input and aria-label of the tag.
+
+        Args:
+            tag (str): The name of the tag.
+            attrs (list): Tuples of attribute name and value.
+        """
+        attributes: Dict[str, str] = {
+            name: value or "" for name, value in attrs
+        }
+        if "aria-label" in attributes:
+            self.labels.append(attributes["aria-label"])
+
+        if tag == "a":
+            self._link = [attributes.get("href", ""), ""]
+        elif tag == "form":
+            self.forms.append({
+                "action": attributes.get("action", ""),
+                "inputs": {}
+            })
+        elif tag == "input" and self.forms and "name" in attributes:
+            self.forms[-1]["inputs"][attributes["name"]] = (
+                attributes.get("value", "")
+            )
+
+    def handle_endtag(self, tag: str) -> None:
+        """
+        Finish the link when its closing tag is reached.
+
+        Args:
+            tag (str): The name of the tag.
+        """
+        if tag == "a" and self._link is not None:
+            self.links.append((self._link[0], " ".join(self._link[1].split())))
+            self._link = None
+
+    def handle_data(self, data: str) -> None:
+        """
+        Collect the text of the current link.
+
+        Args:
+            data (str): The text inside the tag.
+        """
+        if self._link is not None:
+            self._link[1] += data
+
+
+class CancellationWatcher:
+    """
+    A class that watches sold-out slots and reserves them once they reopen.
+
+    Facilities are polled with plain HTTP requests. The time selection page
+    is hashed, and slots are only checked when the hash changes. Each
+    facility has its own interval, which grows while nothing changes and
+    resets after a change. Reopened slots are reserved in worker threads,
+    up to TAB_POOL_SIZE facilities at a time, while the other facilities
+    keep being polled. A reopened slot which fails to be reserved is
+    retried with a growing delay, up to WATCH_MAX_ATTEMPTS times.
+
+    Attributes:
+    - reservation (SlotReservation): The slot reservation instance.
+    - session (requests.Session): The requests session used for polling.
+    - facilities (dict): Watched facilities with their polling state.
+
+    Methods:
+    - __init__(reservation, available_slots):
+        Initialize the CancellationWatcher class.
+    - watch(on_reopen):
+        Poll the facilities until all slots are reserved or time is up.
+    - _check(rec_name) -> List[Dict[str, Any]]:
+        Poll the facility and return its slots which may be reserved now.
+    - _finish_attempt(rec_name):
+        Collect the result of reserving reopened slots of the facility.
+    - _poll(rec_name) -> bool:
+        Check the facility and return True if its page has changed.
+    - _fetch_time_selection(rec_name) -> str:
+        Fetch the time selection page of the facility.
+    - _get_page(url) -> ReservationPageParser:
+        Fetch and parse the page.
+    - _reopened_slots(rec_name, html) -> List[Dict[str, Any]]:
+        Return watched slots which are offered on the page.
+    - _drop_reserved_slots(rec_name, reopened):
+        Stop watching slots of the facility which are already reserved.
+    - _may_attempt(rec_name, rec_slot) -> bool:
+        Return True if the slot may be reserved now.
+    - _record_attempts(rec_name, reopened):
+        Delay the next attempt of slots which failed to be reserved.
+    """
+
+    def __init__(self, reservation: SlotReservation,
+                 available_slots: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Initialize the CancellationWatcher class.
+
+        Args:
+            reservation (SlotReservation): The slot reservation instance.
+            available_slots (dict): Slots to watch grouped by facility.
+        """
+        self.reservation: SlotReservation = reservation
+        self.session: requests.Session = requests.Session()
+        self.session.headers.update({'User-Agent': 'Ottawa Recreation Bot'})
+        self.facilities: Dict[str, Dict[str, Any]] = {
+            rec_name: {
+                "details": rec_details,
+                "activity_link": None,
+                "hash": None,
+                "page": "",
+                "interval": WATCH_MIN_INTERVAL,
+                "attempts": {},
+                "pending": None
+            }
+            for rec_name, rec_details in available_slots.items()
+        }
+
+    def watch(
+        self, on_reopen: Callable[[str, dict, List[Dict[str, Any]]], None]
+    ) -> None:
+        """
+        Poll the facilities until all slots are reserved or time is up.
+
+        Args:
+            on_reopen (Callable): Called in a worker thread with the
+                facility name, details and reopened slots, once any watched
+                slot is offered again.
+        """
+        deadline: float = time.monotonic() + WATCH_DURATION
+        queue: List[Tuple[float, str]] = [
+            (time.monotonic() + random.uniform(0, WATCH_MIN_INTERVAL), name)
+            for name in self.facilities
+        ]
+        heapq.heapify(queue)
+        logging.info(
+            'Watching %d facilities for cancellations...', len(queue)
+        )
+
+        with ThreadPoolExecutor(max_workers=TAB_POOL_SIZE) as executor:
+            while queue:
+                due, rec_name = heapq.heappop(queue)
+                if due > deadline:
+                    break
+                time.sleep(max(0.0, due - time.monotonic()))
+
+                facility = self.facilities[rec_name]
+                if facility["pending"] is not None:
+                    if not facility["pending"][0].done():
+                        # Don't poll while its slots are being reserved
+                        heapq.heappush(queue, (
+                            time.monotonic() + WATCH_MIN_INTERVAL, rec_name
+                        ))
+                        continue
+                    self._finish_attempt(rec_name)
+                    if not facility["details"]["slots"]:
+                        logging.info('✅ Stopped watching %s', rec_name)
+                        continue
+
+                reopened: List[Dict[str, Any]] = self._check(rec_name)
+                if reopened:
+                    facility["pending"] = (executor.submit(
+                        on_reopen, rec_name, facility["details"], reopened
+                    ), reopened)
+
+                heapq.heappush(queue, (
+                    time.monotonic() + facility["interval"] *
+                    random.uniform(0.8, 1.2),
+                    rec_name
+                ))
+
+        for rec_name, facility in self.facilities.items():
+            if facility["pending"] is not None:
+                self._finish_attempt(rec_name)
+
+        logging.info('Finished watching for cancellations')
+
+    def _check(self, rec_name: str) -> List[Dict[str, Any]]:
+        """
+        Poll the facility and return its slots which may be reserved now.
+
+        Also updates the polling interval of the facility.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+
+        Returns:
+            list: Reopened slots which are not waiting for their next attempt.
+        """
+        facility = self.facilities[rec_name]
+        try:
+            changed: bool = self._poll(rec_name)
+        except (requests.exceptions.RequestException, ValueError) as err:
+            logging.error('❌ Failed to poll %s: %s', rec_name, err)
+            changed = False
+
+        reopened: List[Dict[str, Any]] = []
+        if changed or facility["attempts"]:
+            reopened = [
+                rec_slot for rec_slot in self._reopened_slots(
+                    rec_name, facility["page"]
+                )
+                if self._may_attempt(rec_name, rec_slot)
+            ]
+
+        for rec_slot in reopened:
+            logging.info(
+                '✅ Slot in %s at %s is available again',
+                rec_name, rec_slot["starting_time"]
+            )
+
+        if changed and not reopened:
+            facility["interval"] = WATCH_MIN_INTERVAL
+        else:
+            facility["interval"] = min(
+                facility["interval"] * 1.5, WATCH_MAX_INTERVAL
+            )
+        return reopened
+
+    def _finish_attempt(self, rec_name: str) -> None:
+        """
+        Collect the result of reserving reopened slots of the facility.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+        """
+        facility = self.facilities[rec_name]
+        future: Future = facility["pending"][0]
+        reopened: List[Dict[str, Any]] = facility["pending"][1]
+        facility["pending"] = None
+        try:
+            future.result()
+        # Browser, IMAP and page errors differ widely, and none of them may
+        # end watching the other facilities
+        # pylint: disable-next=broad-exception-caught
+        except Exception as err:
+            logging.error(
+                '❌ Failed to reserve reopened slots in %s: %s',
+                rec_name, err
+            )
+        self._drop_reserved_slots(rec_name, reopened)
+        self._record_attempts(rec_name, reopened)
+
+    def _poll(self, rec_name: str) -> bool:
+        """
+        Check the facility and return True if its page has changed.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+
+        Returns:
+            bool: True if the time selection page has changed.
+        """
+        facility = self.facilities[rec_name]
+        html: str = self._fetch_time_selection(rec_name)
+        page_hash: str = hashlib.sha256(
+            VOLATILE_HTML_RE.sub("", html).encode()
+        ).hexdigest()
+
+        if page_hash == facility["hash"]:
+            return False
+
+        logging.info('Page of %s has changed', rec_name)
+        facility["hash"] = page_hash
+        facility["page"] = html
+        return True
+
+    def _fetch_time_selection(self, rec_name: str) -> str:
+        """
+        Fetch the time selection page of the facility.
+
+        The activity link is looked up once and the group size form is
+        submitted on every poll, like in the browser.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+
+        Returns:
+            str: HTML of the time selection page, or of the page telling
+                that there are no available times.
+        """
+        facility = self.facilities[rec_name]
+        details: dict = facility["details"]
+
+        if facility["activity_link"] is None:
+            parser = self._get_page(details["link"])
+            for href, text in parser.links:
+                if text == details["activity_button"]:
+                    facility["activity_link"] = urljoin(details["link"], href)
+                    break
+            else:
+                raise ValueError(
+                    f'activity {details["activity_button"]} not found'
+                )
+
+        response = self.session.get(
+            facility["activity_link"], timeout=WATCH_REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        parser = ReservationPageParser()
+        parser.feed(response.text)
+
+        for form in parser.forms:
+            if "reservationCount" in form["inputs"]:
+                form["inputs"]["reservationCount"] = str(GROUP_SIZE)
+                response = self.session.post(
+                    urljoin(response.url, form["action"]),
+                    data=form["inputs"],
+                    timeout=WATCH_REQUEST_TIMEOUT
+                )
+                response.raise_for_status()
+                break
+
+        return response.text
+
+    def _get_page(self, url: str) -> ReservationPageParser:
+        """
+        Fetch and parse the page.
+
+        Args:
+            url (str): Address of the page.
+
+        Returns:
+            ReservationPageParser: The parsed page.
+        """
+        response = self.session.get(url, timeout=WATCH_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        parser = ReservationPageParser()
+        parser.feed(response.text)
+        return parser
+
+    def _reopened_slots(self, rec_name: str,
+                        html: str) -> List[Dict[str, Any]]:
+        """
+        Return watched slots which are offered on the page.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+            html (str): HTML of the time selection page.
+
+        Returns:
+            list: Watched slots which can be reserved again.
+        """
+        parser = ReservationPageParser()
+        parser.feed(html)
+        offered: set = set()
+        for label in parser.labels:
+            match = TIME_SLOT_LABEL_RE.search(label)
+            if match:
+                offered.add(match.group(0))
+
+        return [
+            rec_slot
+            for rec_slot in self.facilities[rec_name]["details"]["slots"]
+            if SlotReservation.time_slot_key(rec_slot) in offered
+        ]
+
+    def _drop_reserved_slots(self, rec_name: str,
+                             reopened: List[Dict[str, Any]]) -> None:
+        """
+        Stop watching slots of the facility which are already reserved.
+
+        Without a ledger, reopened slots are dropped after the first attempt.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+            reopened (list): Slots which have just been reserved.
+        """
+        facility = self.facilities[rec_name]
+        if self.reservation.ledger is None:
+            facility["details"] = {
+                **facility["details"],
+                "slots": [
+                    rec_slot for rec_slot in facility["details"]["slots"]
+                    if rec_slot not in reopened
+                ]
+            }
+            return
+
+        remaining = self.reservation.ledger.filter_slots(
+            {rec_name: facility["details"]}
+        )
+        facility["details"] = remaining.get(
+            rec_name, {**facility["details"], "slots": []}
+        )
+
+    def _may_attempt(self, rec_name: str, rec_slot: dict) -> bool:
+        """
+        Return True if the slot may be reserved now.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+            rec_slot (dict): Details of the reopened slot.
+
+        Returns:
+            bool: False while the slot waits for its next attempt.
+        """
+        attempt = self.facilities[rec_name]["attempts"].get(
+            SlotReservation.time_slot_key(rec_slot)
+        )
+        return attempt is None or attempt["next"] <= time.monotonic()
+
+    def _record_attempts(self, rec_name: str,
+                         reopened: List[Dict[str, Any]]) -> None:
+        """
+        Delay the next attempt of slots which failed to be reserved.
+
+        The delay doubles after every failure, and a slot is no longer
+        watched after WATCH_MAX_ATTEMPTS failures.
+
+        Args:
+            rec_name (str): Name of the recreation facility.
+            reopened (list): Slots which have just been attempted.
+        """
+        facility = self.facilities[rec_name]
+        for rec_slot in reopened:
+            if rec_slot not in facility["details"]["slots"]:
+                continue
+
+            key: str = SlotReservation.time_slot_key(rec_slot)
+            attempt = facility["attempts"].setdefault(key, {"count": 0})
+            attempt["count"] += 1
+            attempt["next"] = (
+                time.monotonic() +
+                WATCH_MAX_INTERVAL * 2 ** (attempt["count"] - 1)
+            )
+
+            if attempt["count"] >= WATCH_MAX_ATTEMPTS:
+                logging.error(
+                    '❌ Giving up on slot in %s at %s after %d attempts',
+                    rec_name, rec_slot["starting_time"], attempt["count"]
+                )
+                facility["details"] = {
+                    **facility["details"],
+                    "slots": [
+                        slot for slot in facility["details"]["slots"]
+                        if slot != rec_slot
+                    ]
+                }
@@ -1,7 +1,11 @@
+import datetime
 import imaplib
 import email
 import re
 from email.header import decode_header
+from email.message import Message
+from email.utils import parsedate_to_datetime
+from typing import Optional
 from constant import FROM_EMAIL, FROM_SUBJECT
 
 
@@ -17,8 +21,10 @@ class ConfirmationCodeExtractor:
     Methods:
     - __init__(self, imap_server: str, imap_email: str, imap_password: str):
         Initializes an instance of the ConfirmationCodeExtractor class.
-    - get_confirmation_code(self) -> str:
+    - get_confirmation_code(self, sent_after) -> str:
         Retrieves the confirmation code from the latest email.
+    - _sent_before(email_message, sent_after) -> bool:
+        Check if the email is dated before the given time.
     - _decode_bytes(self, value: bytes) -> str:
         Decode the value if it's in bytes format.
 
@@ -40,10 +46,19 @@ class ConfirmationCodeExtractor:
         self.imap_email = imap_email
         self.imap_password = imap_password
 
-    def get_confirmation_code(self) -> str:
+    def get_confirmation_code(
+        self, sent_after: Optional[datetime.datetime] = None
+    ) -> str:
         """
         Retrieve the confirmation code from the latest email.
 
+        Unseen emails dated before sent_after are marked as seen and
+        skipped, so a code which arrived too late for an earlier
+        reservation is never used.
+
+        Args:
+        - sent_after (datetime): Skip emails dated before this time.
+
         Returns:
         - confirmation_code (str): The extracted confirmation code.
         """
@@ -63,6 +78,9 @@ class ConfirmationCodeExtractor:
                 subject = self._decode_bytes(subject_header)
                 email_from = self._decode_bytes(from_header)
 
+                if self._sent_before(email_message, sent_after):
+                    continue
+
                 if FROM_EMAIL in email_from and FROM_SUBJECT in subject:
                     for part in email_message.walk():
                         if part.get_content_type() == "text/plain":
@@ -73,6 +91,29 @@ class ConfirmationCodeExtractor:
 
         return None
 
+    @staticmethod
+    def _sent_before(email_message: Message,
+                     sent_after: Optional[datetime.datetime]) -> bool:
+        """
+        Check if the email is dated before the given time.
+
+        Args:
+        - email_message (Message): The email to check.
+        - sent_after (datetime): The time to compare with, if any.
+
+        Returns:
+        - True if the email has a valid date before sent_after.
+        """
+        if sent_after is None or email_message["Date"] is None:
+            return False
+        try:
+            sent = parsedate_to_datetime(email_message["Date"])
+        except (TypeError, ValueError):
+            return False
+        if sent.tzinfo is None:
+            sent = sent.replace(tzinfo=datetime.timezone.utc)
+        return sent < sent_after
+
     @staticmethod
     def _decode_bytes(value: bytes) -> str:
         """
@@ -32,16 +32,83 @@ Set to True for running Chrome in headless mode (without a visible window).
 Set to False for watching the Chrome window during execution.
 """
 
+WATCH_MODE = False
+"""
+Set to True for watching sold-out slots and reserving them once they
+are cancelled, instead of waiting for the target run time. Needs a job
+running for WATCH_DURATION, not the 8 minute Autoreservation workflow.
+"""
+
+WATCH_DURATION = 4 * 60 * 60
+"""
+The number of seconds to watch for cancellations.
+"""
+
+WATCH_MIN_INTERVAL = 30
+"""
+The minimum number of seconds between two polls of a facility.
+"""
+
+WATCH_MAX_INTERVAL = 300
+"""
+The maximum number of seconds between two polls of a facility.
+"""
+
+WATCH_MAX_ATTEMPTS = 3
+"""
+The number of failed reservation attempts after which a reopened slot
+is no longer watched. Attempts are spaced at least WATCH_MAX_INTERVAL
+seconds apart, doubling after every failure.
+"""
+
+WATCH_REQUEST_TIMEOUT = 10
+"""
+The number of seconds to wait for a response while polling a facility.
+"""
+
+TAB_POOL_SIZE = 3
+"""
+The maximum number of facilities reserved at the same time, each in its
+own tab of a single Chrome instance.
+"""
+
+TAB_MEMORY_BUDGET_MB = 1024
+"""
+The memory budget of Chrome in MB. No new tab is opened above it.
+"""
+
 MAX_RETRIES = 3
 """
 The number of retries for clicking the Confirm button.
 """
 
+VERIFICATION_CODE_TIMEOUT = 120
+"""
+The number of seconds to wait for the verification code email.
+"""
+
+VERIFICATION_CODE_CLOCK_SKEW = 60
+"""
+The number of seconds a verification code email may be dated before the
+reservation was submitted. Older emails belong to earlier reservations.
+Must be less than VERIFICATION_CODE_TIMEOUT.
+"""
+
 SCHEDULE_JSON = "schedule.json"
 """
 The name of the JSON file containing the schedule.
 """
 
+LEDGER_JSON = "booking_ledger.json"
+"""
+The name of the JSON file containing reserved and in-flight slots.
+"""
+
+LEDGER_LEASE_SECONDS = 600
+"""
+The number of seconds an in-flight reservation blocks other runs.
+"""
+
 # Reservation Configuration
 TARGET_RUN_TIME = "18:00:00"
 """
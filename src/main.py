@@ -2,15 +2,21 @@
 
 import logging
 import os
+import threading
 import time
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Dict, Any, List
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from slot_finder import SlotFinder
 from slot_reservation import SlotReservation
-from constant import TARGET_RUN_TIME, SCHEDULE_JSON, CRON_MODE, CHROME_HEADLESS
+from booking_ledger import BookingLedger
+from browser_session import TabPool, open_browser
+from cancellation_watcher import CancellationWatcher
+from constant import (
+    TARGET_RUN_TIME, SCHEDULE_JSON, LEDGER_JSON, CRON_MODE, WATCH_MODE,
+    TAB_POOL_SIZE
+)
 
 
 class SlotReservationApp:
@@ -31,28 +37,36 @@ class SlotReservationApp:
         self.schedule_json_path: str = os.path.join(
             self.script_dir, '..', SCHEDULE_JSON
         )
+        self.ledger_json_path: str = os.path.join(
+            self.script_dir, '..', LEDGER_JSON
+        )
 
     def run(self) -> None:
         """
         Run the slot reservation application.
         """
         self._configure_logging()
+
+        finder: SlotFinder = SlotFinder(self.schedule_json_path)
+        available_slots: Dict[str, Dict[str, Any]] = finder.find_slots()
+
+        reservation: SlotReservation = SlotReservation()
+        reservation.ledger = BookingLedger(
+            self.ledger_json_path, reservation.env_var.imap_email
+        )
+        available_slots = reservation.ledger.filter_slots(available_slots)
+        if not available_slots:
+            logging.info('✅ All followed slots are already reserved')
+            return
+
+        if WATCH_MODE:
+            self._run_cancellation_watcher(reservation, available_slots)
+            return
+
         self._wait_for_cron_mode()
 
-        chrome_options: Options = Options()
-        if CHROME_HEADLESS:
-            chrome_options.add_argument("--headless")
-        service: Service = Service(ChromeDriverManager().install())
-        service.start()
-
-        try:
-            with webdriver.Chrome(
-                service=service,
-                options=chrome_options
-            ) as driver:
-                self._run_slot_reservation(driver)
-        finally:
-            service.stop()
+        with open_browser() as driver:
+            self._run_slot_reservation(driver, reservation, available_slots)
 
     def _configure_logging(self) -> None:
         """
@@ -79,23 +93,74 @@ class SlotReservationApp:
                 )
                 logging.info(message)
 
-    def _run_slot_reservation(self, driver: webdriver.Chrome) -> None:
+    def _run_slot_reservation(
+        self, driver: webdriver.Chrome, reservation: SlotReservation,
+        available_slots: Dict[str, Dict[str, Any]]
+    ) -> None:
         """
         Run the slot reservation process.
 
+        Facilities are reserved concurrently, each in its own tab.
+
         Args:
             driver (webdriver.Chrome): The Chrome webdriver instance.
+            reservation (SlotReservation): The slot reservation instance.
+            available_slots (dict): Slots to reserve grouped by facility.
 
         """
-        finder: SlotFinder = SlotFinder(self.schedule_json_path)
-        available_slots: Dict[str, Dict[str, Any]] = finder.find_slots()
+        def reserve(rec_name: str, rec_details: dict) -> None:
+            with pool.tab() as tab:
+                reservation.reserve_facility_slots(tab, rec_name, rec_details)
+
+        with TabPool(driver) as pool:
+            with ThreadPoolExecutor(max_workers=TAB_POOL_SIZE) as executor:
+                futures = [
+                    executor.submit(reserve, rec_name, rec_details)
+                    for rec_name, rec_details in available_slots.items()
+                ]
+                for future in futures:
+                    future.result()
+            pool.report()
+
+    def _run_cancellation_watcher(
+        self, reservation: SlotReservation,
+        available_slots: Dict[str, Dict[str, Any]]
+    ) -> None:
+        """
+        Watch sold-out slots and reserve them once they are cancelled.
 
-        reservation: SlotReservation = SlotReservation()
+        Chrome is only started when a watched slot is offered again. It is
+        then kept for the rest of the watch, and reservations of different
+        facilities run in its tabs.
 
-        for rec_name, rec_details in available_slots.items():
-            for rec_slot in rec_details["slots"]:
-                reservation.reserve_slots(driver, rec_name,
-                                          rec_details, rec_slot)
+        Args:
+            reservation (SlotReservation): The slot reservation instance.
+            available_slots (dict): Slots to watch grouped by facility.
+        """
+        browser_lock: threading.Lock = threading.Lock()
+        pools: List[TabPool] = []
+
+        with ExitStack() as stack:
+            def on_reopen(rec_name: str, rec_details: dict,
+                          rec_slots: List[Dict[str, Any]]) -> None:
+                with browser_lock:
+                    if not pools:
+                        driver = stack.enter_context(open_browser())
+                        pools.append(stack.enter_context(TabPool(driver)))
+
+                # The page has changed, so the cached time slots are outdated
+                reservation.time_slot_maps.pop(rec_name, None)
+                with pools[0].tab() as tab:
+                    for rec_slot in rec_slots:
+                        reservation.reserve_slots(tab, rec_name,
+                                                  rec_details, rec_slot)
+
+            watcher: CancellationWatcher = CancellationWatcher(
+                reservation, available_slots
+            )
+            watcher.watch(on_reopen)
+            if pools:
+                pools[0].report()
 
 
 if __name__ == "__main__":
@@ -64,7 +64,8 @@ class SlotFinder:
 
                     slot_data: Dict[str, Any] = {
                         "day_of_week": slot["day_of_week"],
-                        "starting_time": slot["starting_time"]
+                        "starting_time": slot["starting_time"],
+                        "date": future_weekday.isoformat()
                     }
                     slots.append(slot_data)
 
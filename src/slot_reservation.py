@@ -1,14 +1,37 @@
 import calendar
+import datetime
 import logging
+import re
+import threading
 import time
 import random
-from typing import Any
+from typing import Any, Dict, Optional
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
 from confirmation_code_extractor import ConfirmationCodeExtractor
 from telegram_bot import TelegramBot
 from env_vars import EnvVars
-from constant import GROUP_SIZE, MAX_RETRIES
+from booking_ledger import BookingLedger
+from constant import (
+    GROUP_SIZE, MAX_RETRIES, VERIFICATION_CODE_TIMEOUT,
+    VERIFICATION_CODE_CLOCK_SKEW
+)
+
+TIME_SLOT_LABEL_RE = re.compile(
+    r"\d{1,2}:\d{2} [AP]M (?:" + "|".join(calendar.day_name) + ")"
+)
+
+# Collects label, link and text of all labelled elements in one round trip
+TIME_SLOT_SCRIPT = """
+return Array.from(
+    document.querySelectorAll('[aria-label]'),
+    element => [
+        element.getAttribute('aria-label') || '',
+        element.href || '',
+        element.innerText || ''
+    ]
+);
+"""
 
 
 class SlotReservation:
@@ -19,12 +42,29 @@ class SlotReservation:
     - env_var (EnvVars): An instance of the EnvVars class containing env vars.
     - telegram_bot (TelegramBot): An instance of the TelegramBot class
         for sending messages and photos.
+    - ledger (BookingLedger): Optional ledger of reserved slots.
+    - time_slot_maps (dict): Time slots offered by each facility, keyed by
+        facility name and then by "<starting time> <weekday>".
+    - verification_lock (threading.Lock): Lock held from clicking submit on
+        the reservation form until the verification code is entered.
 
     Methods:
+    - reserve_facility_slots(driver, rec_name, rec_details):
+        Reserves all followed slots in the given recreation facility.
     - reserve_slots(driver, rec_name, rec_details, rec_slot):
         Reserves slots in the given recreation facility.
     - _reserve_slot(driver, rec_name, rec_details, rec_slot):
         Helper method that performs the actual slot reservation.
+    - time_slot_key(rec_slot):
+        Builds the time slot map key of the given slot.
+    - _get_time_slot_map(driver, rec_name, rec_details, refresh):
+        Returns the cached time slot map of the facility.
+    - _load_time_slot_map(driver, rec_name, rec_details):
+        Parses the time selection page of the facility.
+    - _open_time_slot(driver, rec_name, rec_details, rec_slot):
+        Opens the reservation form of the given slot.
+    - _enter_confirmation_code(driver, submitted):
+        Waits for the verification code email and submits the code.
     - _fill_reservation_form(driver):
         Fills the reservation form with user details.
     - _perform_retry(driver):
@@ -40,6 +80,57 @@ class SlotReservation:
         env_vars = EnvVars.check_env_vars(EnvVars.REQUIRED_VARS)
         self.env_var: EnvVars = EnvVars(env_vars)
         self.telegram_bot: TelegramBot = TelegramBot(self.env_var)
+        self.ledger: Optional[BookingLedger] = None
+        self.time_slot_maps: Dict[
+            str, Optional[Dict[str, Dict[str, str]]]
+        ] = {}
+        self.verification_lock: threading.Lock = threading.Lock()
+
+    def reserve_facility_slots(self, driver: Any, rec_name: str,
+                               rec_details: dict) -> None:
+        """
+        Reserves all followed slots in the given recreation facility.
+
+        The time selection page is parsed once, slots which are not offered
+        are reported right away and the rest are reserved one by one.
+
+        Args:
+            driver (Any): WebDriver object for interacting with the browser.
+            rec_name (str): Name of the recreation facility.
+            rec_details (dict): Details of the recreation facility.
+        """
+        try:
+            time_slot_map = self._get_time_slot_map(
+                driver, rec_name, rec_details
+            )
+        except NoSuchElementException as err:
+            message: str = (
+                f'❌ Failed to load time slots in {rec_name} '
+                f'({rec_details["activity_button"]}), exception: {err}'
+            )
+            logging.error(message)
+            self.telegram_bot.send_message(message)
+            self.telegram_bot.send_photo(driver.get_screenshot_as_png())
+            return
+
+        if time_slot_map is None:
+            return
+
+        offered_slots = []
+        for rec_slot in rec_details["slots"]:
+            if self.time_slot_key(rec_slot) in time_slot_map:
+                offered_slots.append(rec_slot)
+                continue
+
+            message: str = (
+                f'❌ Slot in {rec_name} at {rec_slot["starting_time"]} '
+                f'is not offered ({rec_details["activity_button"]})'
+            )
+            logging.error(message)
+            self.telegram_bot.send_message(message)
+
+        for rec_slot in offered_slots:
+            self.reserve_slots(driver, rec_name, rec_details, rec_slot)
 
     def reserve_slots(self, driver: Any, rec_name: str,
                       rec_details: dict, rec_slot: dict) -> None:
@@ -52,8 +143,20 @@ class SlotReservation:
             rec_details (dict): Details of the recreation facility.
             rec_slot (dict): Details of the slot to be reserved.
         """
+        if self.ledger and not self.ledger.acquire(
+            rec_name, rec_details, rec_slot
+        ):
+            logging.info(
+                '✅ Skipping slot in %s at %s, already reserved',
+                rec_name, rec_slot["starting_time"]
+            )
+            return
+
+        reserved: bool = False
         try:
-            self._reserve_slot(driver, rec_name, rec_details, rec_slot)
+            reserved = self._reserve_slot(
+                driver, rec_name, rec_details, rec_slot
+            )
         except NoSuchElementException as err:
             message: str = (
                 f'❌ Failed to reserve a slot in {rec_name} '
@@ -63,6 +166,11 @@ class SlotReservation:
             logging.error(message)
             self.telegram_bot.send_message(message)
             self.telegram_bot.send_photo(driver.get_screenshot_as_png())
+        finally:
+            if self.ledger and reserved:
+                self.ledger.confirm(rec_name, rec_details, rec_slot)
+            elif self.ledger:
+                self.ledger.release(rec_name, rec_details, rec_slot)
 
     def _reserve_slot(self, driver: Any, rec_name: str,
                       rec_details: dict, rec_slot: dict) -> bool:
@@ -80,6 +188,129 @@ class SlotReservation:
             rec_name, rec_slot["starting_time"]
         )
 
+        if not self._open_time_slot(driver, rec_name, rec_details, rec_slot):
+            message: str = (
+                f'❌ Failed to reserve slot in {rec_name} '
+                f'at {rec_slot["starting_time"]}, '
+                f'incorrect time slot'
+            )
+            logging.error(message)
+            self.telegram_bot.send_message(message)
+            self.telegram_bot.send_photo(driver.get_screenshot_as_png())
+            return False
+
+        self._fill_reservation_form(driver)
+
+        # Only one reservation at a time may wait for a verification code,
+        # otherwise concurrent jobs could take each other's codes
+        with self.verification_lock:
+            submitted: datetime.datetime = datetime.datetime.now(
+                datetime.timezone.utc
+            )
+            driver.find_element(By.CLASS_NAME, "mdc-button__ripple").click()
+
+            if not self._perform_retry(driver):
+                message: str = (
+                    f'❌ Failed to reserve slot in {rec_name} '
+                    f'at {rec_slot["starting_time"]} '
+                    f'({rec_details["activity_button"]}) '
+                    f'after {MAX_RETRIES} retries'
+                )
+                logging.error(message)
+                self.telegram_bot.send_message(message)
+                self.telegram_bot.send_photo(driver.get_screenshot_as_png())
+                return False
+
+            if not self._enter_confirmation_code(driver, submitted):
+                message: str = (
+                    f'❌ Failed to reserve slot in {rec_name} '
+                    f'at {rec_slot["starting_time"]} '
+                    f'({rec_details["activity_button"]}), no verification '
+                    f'code within {VERIFICATION_CODE_TIMEOUT} seconds'
+                )
+                logging.error(message)
+                self.telegram_bot.send_message(message)
+                self.telegram_bot.send_photo(driver.get_screenshot_as_png())
+                return False
+
+        try:
+            driver.find_element(
+                By.XPATH,
+                "//*[text()='Time and number of participants']"
+            )
+            driver.find_elements(
+                By.CLASS_NAME, "mdc-button__ripple"
+            )[-1].click()
+        except NoSuchElementException:
+            logging.info("Skipping final confirmation page...")
+
+        message: str = (
+            f'✅ Successfully reserved a slot in {rec_name} '
+            f'at {rec_slot["starting_time"]} '
+            f'({rec_details["activity_button"]})'
+        )
+        logging.info(message)
+        self.telegram_bot.send_message(message)
+        self.telegram_bot.send_photo(driver.get_screenshot_as_png())
+
+        return True
+
+    @staticmethod
+    def time_slot_key(rec_slot: dict) -> str:
+        """
+        Builds the time slot map key of the given slot.
+
+        Args:
+            rec_slot (dict): Details of the slot.
+
+        Returns:
+            str: Key in the "<starting time> <weekday>" format.
+        """
+        weekday_name = calendar.day_name[rec_slot["day_of_week"]-1]
+        return f'{rec_slot["starting_time"]} {weekday_name}'
+
+    def _get_time_slot_map(
+        self, driver: Any, rec_name: str, rec_details: dict,
+        refresh: bool = False
+    ) -> Optional[Dict[str, Dict[str, str]]]:
+        """
+        Returns the cached time slot map of the facility.
+
+        Args:
+            driver (Any): WebDriver object for interacting with the browser.
+            rec_name (str): Name of the recreation facility.
+            rec_details (dict): Details of the recreation facility.
+            refresh (bool): Reload the map even if it is already cached.
+
+        Returns:
+            dict: Offered time slots, or None when nothing can be reserved.
+        """
+        if refresh or rec_name not in self.time_slot_maps:
+            self.time_slot_maps[rec_name] = self._load_time_slot_map(
+                driver, rec_name, rec_details
+            )
+        return self.time_slot_maps[rec_name]
+
+    def _load_time_slot_map(
+        self, driver: Any, rec_name: str, rec_details: dict
+    ) -> Optional[Dict[str, Dict[str, str]]]:
+        """
+        Parses the time selection page of the facility.
+
+        Only the last date (the reservation date) is expanded, so slots are
+        keyed by starting time and weekday. The capacity text is kept for
+        logging only.
+
+        Args:
+            driver (Any): WebDriver object for interacting with the browser.
+            rec_name (str): Name of the recreation facility.
+            rec_details (dict): Details of the recreation facility.
+
+        Returns:
+            dict: Offered time slots, or None when nothing can be reserved.
+        """
+        logging.info('Loading time slots in %s...', rec_name)
+
         driver.get(rec_details["link"])
         driver.find_element(
             By.XPATH,
@@ -95,68 +326,123 @@ class SlotReservation:
                 By.XPATH, "//form[contains(@action, 'NoAvailableTime')]"
             )
             message: str = (
-                f'❌ No more available times in {rec_name} at '
-                f'{rec_slot["starting_time"]} '
+                f'❌ No more available times in {rec_name} '
                 f'({rec_details["activity_button"]})'
             )
             logging.error(message)
             self.telegram_bot.send_message(message)
             self.telegram_bot.send_photo(driver.get_screenshot_as_png())
-            return False
+            return None
 
         # When page doesn't have dialogue 'How many people in your group?'
         if reservation_count_input.get_attribute("type") == "hidden":
             message: str = (
-                f'❌ No slots available in {rec_name} at '
-                f'{rec_slot["starting_time"]} '
+                f'❌ No slots available in {rec_name} '
                 f'({rec_details["activity_button"]})'
             )
             logging.error(message)
             self.telegram_bot.send_message(message)
             self.telegram_bot.send_photo(driver.get_screenshot_as_png())
-            return False
+            return None
 
         reservation_count_input.clear()
         reservation_count_input.send_keys(GROUP_SIZE)
         driver.find_element(By.CLASS_NAME, "mdc-button__ripple").click()
-        driver.find_elements(By.CLASS_NAME, "header-text")[-1].click()
-        weekday_name = calendar.day_name[rec_slot["day_of_week"]-1]
+        date_headers = driver.find_elements(By.CLASS_NAME, "header-text")
+        if not date_headers:
+            raise NoSuchElementException("No dates on the time page")
+        date_headers[-1].click()
+
+        page: str = driver.current_url
+        time_slot_map: Dict[str, Dict[str, str]] = {}
+        for label, href, text in driver.execute_script(TIME_SLOT_SCRIPT):
+            match = TIME_SLOT_LABEL_RE.search(label)
+            if match:
+                time_slot_map.setdefault(match.group(0), {
+                    "label": label,
+                    "href": href,
+                    "capacity": text.strip(),
+                    "page": page
+                })
 
-        try:
-            driver.find_element(
-                By.CSS_SELECTOR,
-                "[aria-label*='" +
-                rec_slot["starting_time"] + " " +
-                weekday_name + "']"
-            ).click()
-            time.sleep(random.uniform(0.1, 0.9))
-        except NoSuchElementException:
-            message: str = (
-                f'❌ Failed to reserve slot in {rec_name} '
-                f'at {rec_slot["starting_time"]}, '
-                f'incorrect time slot'
-            )
-            logging.error(message)
-            self.telegram_bot.send_message(message)
-            self.telegram_bot.send_photo(driver.get_screenshot_as_png())
-            return False
+        logging.info(
+            'Found %d time slots in %s', len(time_slot_map), rec_name
+        )
+        return time_slot_map
 
-        self._fill_reservation_form(driver)
+    def _open_time_slot(self, driver: Any, rec_name: str,
+                        rec_details: dict, rec_slot: dict) -> bool:
+        """
+        Opens the reservation form of the given slot.
 
-        if not self._perform_retry(driver):
-            message: str = (
-                f'❌ Failed to reserve slot in {rec_name} '
-                f'at {rec_slot["starting_time"]} '
-                f'({rec_details["activity_button"]}) '
-                f'after {MAX_RETRIES} retries'
+        The slot is resolved from the time slot map. When the slot can't be
+        opened from it, the page has changed, so the map is rebuilt once
+        through the activity and group size steps.
+
+        Args:
+            driver (Any): WebDriver object for interacting with the browser.
+            rec_name (str): Name of the recreation facility.
+            rec_details (dict): Details of the recreation facility.
+            rec_slot (dict): Details of the slot to be reserved.
+
+        Returns:
+            bool: True if the reservation form is opened.
+        """
+        key = self.time_slot_key(rec_slot)
+        for attempt in range(2):
+            time_slot_map = self._get_time_slot_map(
+                driver, rec_name, rec_details, refresh=attempt > 0
             )
-            logging.error(message)
-            self.telegram_bot.send_message(message)
-            self.telegram_bot.send_photo(driver.get_screenshot_as_png())
-            return False
+            if not time_slot_map or key not in time_slot_map:
+                return False
+
+            time_slot = time_slot_map[key]
+            logging.info(
+                'Opening slot %s in %s (%s)...',
+                key, rec_name, time_slot["capacity"] or "no capacity info"
+            )
+            try:
+                if driver.current_url == time_slot["page"]:
+                    driver.find_element(
+                        By.CSS_SELECTOR,
+                        "[aria-label='" + time_slot["label"] + "']"
+                    ).click()
+                elif time_slot["href"]:
+                    driver.get(time_slot["href"])
+                else:
+                    # The time page is reached by submitting the group size
+                    # form, so it can only be rebuilt, not reloaded
+                    continue
+            except NoSuchElementException:
+                continue
+            time.sleep(random.uniform(0.1, 0.9))
+
+            if driver.find_elements(By.ID, "telephone"):
+                return True
+
+        return False
 
+    def _enter_confirmation_code(self, driver: Any,
+                                 submitted: datetime.datetime) -> bool:
+        """
+        Waits for the verification code email and submits the code.
+
+        Emails dated more than VERIFICATION_CODE_CLOCK_SKEW seconds before
+        the reservation was submitted are ignored, as their codes belong to
+        earlier reservations which timed out.
+
+        Args:
+            driver (Any): WebDriver object for interacting with the browser.
+            submitted (datetime): When the reservation form was submitted.
+
+        Returns:
+            bool: False if no code arrives within VERIFICATION_CODE_TIMEOUT.
+        """
+        deadline: float = time.monotonic() + VERIFICATION_CODE_TIMEOUT
         confirmation_code = None
         while confirmation_code is None:
+            if time.monotonic() > deadline:
+                return False
             time.sleep(1)
             logging.info("Waiting for a code to verify reservation...")
             extractor = ConfirmationCodeExtractor(
@@ -164,7 +450,11 @@ class SlotReservation:
                 self.env_var.imap_email,
                 self.env_var.imap_password
             )
-            confirmation_code = extractor.get_confirmation_code()
+            confirmation_code = extractor.get_confirmation_code(
+                submitted - datetime.timedelta(
+                    seconds=VERIFICATION_CODE_CLOCK_SKEW
+                )
+            )
 
         logging.info('✅ Verification code is %s', confirmation_code)
 
@@ -172,27 +462,6 @@ class SlotReservation:
         code_input.clear()
         code_input.send_keys(confirmation_code)
         driver.find_element(By.CLASS_NAME, "mdc-button__ripple").click()
-
-        try:
-            driver.find_element(
-                By.XPATH,
-                "//*[text()='Time and number of participants']"
-            )
-            driver.find_elements(
-                By.CLASS_NAME, "mdc-button__ripple"
-            )[-1].click()
-        except NoSuchElementException:
-            logging.info("Skipping final confirmation page...")
-
-        message: str = (
-            f'✅ Successfully reserved a slot in {rec_name} '
-            f'at {rec_slot["starting_time"]} '
-            f'({rec_details["activity_button"]})'
-        )
-        logging.info(message)
-        self.telegram_bot.send_message(message)
-        self.telegram_bot.send_photo(driver.get_screenshot_as_png())
-
         return True
 
     def _fill_reservation_form(self, driver: Any) -> None:
@@ -223,7 +492,6 @@ class SlotReservation:
             time.sleep(random.uniform(0.01, 0.1))
 
         time.sleep(random.uniform(1, 2))
-        driver.find_element(By.CLASS_NAME, "mdc-button__ripple").click()
 
     @staticmethod
     def _perform_retry(driver: Any) -> bool:
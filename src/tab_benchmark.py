@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException
+from browser_session import TabPool, open_browser, process_tree_memory_mb
+from constant import GROUP_SIZE, SCHEDULE_JSON, TAB_POOL_SIZE
+
+
+class TabBenchmark:
+    """
+    Class comparing one Chrome per job against tabs of a single Chrome.
+
+    The workload takes every facility from the schedule through the same
+    steps as a reservation up to the time selection page: the activity,
+    the group size form and the last date. It stops before a slot is
+    opened, so nothing gets reserved and no verification email is sent.
+
+    Attributes:
+    - facilities (list): Facilities from the schedule.
+    - pids (set): Process IDs of running chromedriver instances.
+    - peak_memory_mb (float): Peak memory of all Chrome instances.
+
+    Methods:
+    - __init__(json_file_path: str):
+        Initialize the TabBenchmark class.
+    - run():
+        Run the workload in both models and log the comparison.
+    """
+
+    def __init__(self, json_file_path: str) -> None:
+        """
+        Initialize the TabBenchmark class.
+
+        Args:
+            json_file_path (str): Path to the JSON file with the schedule.
+        """
+        with open(json_file_path, encoding="utf-8") as file:
+            self.facilities: List[Dict[str, Any]] = (
+                json.load(file)["facilities"]
+            )
+        self.pids: set = set()
+        self.peak_memory_mb: float = 0.0
+
+    def run(self) -> None:
+        """
+        Run the workload in both models and log the comparison.
+        """
+        results: Dict[str, Dict[str, float]] = {
+            "one browser per job": self._measure(self._browser_per_job),
+            "tabs in one browser": self._measure(self._tabs_in_one_browser)
+        }
+
+        logging.info(
+            'Workload: %d facilities, %d at a time',
+            len(self.facilities), TAB_POOL_SIZE
+        )
+        for model, result in results.items():
+            logging.info(
+                '%s: peak memory %.0f MB, total %.1fs, '
+                'mean job latency %.1fs',
+                model, result["peak_memory_mb"], result["total"],
+                result["latency"]
+            )
+
+    def _measure(
+        self, model: Callable[[List[float]], None]
+    ) -> Dict[str, float]:
+        """
+        Run the workload in the model while sampling Chrome memory.
+
+        Args:
+            model (Callable): Runs the workload and appends job latencies.
+
+        Returns:
+            dict: Peak memory, total time and mean job latency.
+        """
+        self.pids.clear()
+        self.peak_memory_mb = 0.0
+        latencies: List[float] = []
+        finished = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(finished,))
+        sampler.start()
+
+        started: float = time.monotonic()
+        try:
+            model(latencies)
+        finally:
+            finished.set()
+            sampler.join()
+
+        return {
+            "peak_memory_mb": self.peak_memory_mb,
+            "total": time.monotonic() - started,
+            "latency": sum(latencies) / max(len(latencies), 1)
+        }
+
+    def _sample(self, finished: threading.Event) -> None:
+        """
+        Record the peak memory of all running Chrome instances.
+
+        Args:
+            finished (threading.Event): Set once the workload is done.
+        """
+        while not finished.wait(0.2):
+            memory: float = sum(
+                process_tree_memory_mb(pid) for pid in list(self.pids)
+            )
+            self.peak_memory_mb = max(self.peak_memory_mb, memory)
+
+    def _browser_per_job(self, latencies: List[float]) -> None:
+        """
+        Run every job in its own Chrome instance.
+
+        Args:
+            latencies (list): Job latencies are appended to it.
+        """
+        def job(facility: Dict[str, Any]) -> None:
+            started: float = time.monotonic()
+            with open_browser() as driver:
+                pid: int = driver.service.process.pid
+                self.pids.add(pid)
+                self._open_time_page(driver, facility)
+                self.pids.discard(pid)
+            latencies.append(time.monotonic() - started)
+
+        with ThreadPoolExecutor(max_workers=TAB_POOL_SIZE) as executor:
+            list(executor.map(job, self.facilities))
+
+    def _tabs_in_one_browser(self, latencies: List[float]) -> None:
+        """
+        Run every job in a tab of a single Chrome instance.
+
+        Args:
+            latencies (list): Job latencies are appended to it.
+        """
+        with open_browser() as driver:
+            self.pids.add(driver.service.process.pid)
+            with TabPool(driver) as pool:
+                def job(facility: Dict[str, Any]) -> None:
+                    started: float = time.monotonic()
+                    with pool.tab() as tab:
+                        self._open_time_page(tab, facility)
+                    latencies.append(time.monotonic() - started)
+
+                with ThreadPoolExecutor(
+                    max_workers=TAB_POOL_SIZE
+                ) as executor:
+                    list(executor.map(job, self.facilities))
+                pool.report()
+
+    @staticmethod
+    def _open_time_page(driver: Any, facility: Dict[str, Any]) -> None:
+        """
+        Open the time selection page of the facility.
+
+        Args:
+            driver (Any): WebDriver object for interacting with the browser.
+            facility (dict): Facility from the schedule.
+        """
+        driver.get(facility["link"])
+        try:
+            driver.find_element(
+                By.XPATH,
+                "//div[text()='" + facility["activity_button"] + "']"
+            ).click()
+            reservation_count_input = driver.find_element(
+                By.ID, "reservationCount"
+            )
+            if reservation_count_input.get_attribute("type") != "hidden":
+                reservation_count_input.clear()
+                reservation_count_input.send_keys(GROUP_SIZE)
+                driver.find_element(
+                    By.CLASS_NAME, "mdc-button__ripple"
+                ).click()
+            driver.find_elements(By.CLASS_NAME, "header-text")[-1].click()
+        except (NoSuchElementException, IndexError) as err:
+            logging.error(
+                '❌ Time page of %s (%s) not reached: %s',
+                facility["name"], facility["activity_button"], err
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s | %(levelname)s: %(message)s',
+        level=logging.INFO
+    )
+    logging.getLogger('WDM').setLevel(logging.ERROR)
+    TabBenchmark(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', SCHEDULE_JSON
+    )).run()